@@ -88,9 +88,19 @@ class MetricMeter:
         self.vals = vals
         self.reduce_nan = reduce_nan
 
+    @property
+    def vals(self):
+        return self._buf[:self._count]
+
+    @vals.setter
+    def vals(self, vals):
+        # values live in a preallocated buffer that is larger than the number of values (count)
+        self._buf = vals
+        self._count = len(vals)
+
     @property
     def count(self):
-        return self.vals.numel()
+        return self._count
 
     @property
     def std(self):
@@ -167,9 +177,16 @@ class MetricMeter:
         if math.isnan(val) and self.reduce_nan:
             return
 
-        # convert to torch.tensor
         self.val = val
-        self.vals = torch.cat((self.vals, torch.Tensor([val])), 0)
+
+        if self._count == len(self._buf):  # grow buffer geometrically, i.e. amortised constant time per update
+            buf = torch.empty(max(2 * self._count, 64),
+                              dtype=torch.promote_types(self._buf.dtype, torch.get_default_dtype()))
+            buf[:self._count] = self._buf[:self._count]
+            self._buf = buf
+
+        self._buf[self._count] = val
+        self._count += 1
 
     def __str__(self):
         if self.count >= 2:
@@ -1,13 +1,17 @@
 import argparse
 import copy
 import datetime
+import inspect
 import os
 import shutil
 import socket
 import sys
 from pathlib import Path
+from typing import Optional, Tuple
 
 import torch
+import torch.distributed
+import torch.utils.data.distributed
 
 import decode.evaluation
 import decode.neuralfitter
@@ -47,6 +51,9 @@ def parse_args():
     parser.add_argument('-c', '--log_comment', default=None,
                         help='Add a log_comment to the run.')
 
+    parser.add_argument('--local_rank', '--local-rank', dest='local_rank', default=None, type=int,
+                        help='Set by torch.distributed.launch for multi-GPU training. Do not set by hand.')
+
     args = parser.parse_args()
     return args
 
@@ -54,7 +61,7 @@ def parse_args():
 def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool = False,
                       no_log: bool = False,
                       num_worker_override: int = None,
-                      log_folder: str = 'runs', log_comment: str = None):
+                      log_folder: str = 'runs', log_comment: str = None, local_rank: int = None):
     """
     Sets up the engine to train DECODE. Includes sample simulation and the actual training.
 
@@ -66,6 +73,7 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
         num_worker_override: overwrite number of workers for dataloader
         log_folder: folder for logging (where tensorboard puts its stuff)
         log_comment: comment to the experiment
+        local_rank: process index on this node for distributed training (usually set via environment)
 
     """
 
@@ -79,6 +87,13 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
     # add meta information
     param.Meta.version = decode.utils.bookkeeping.decode_state()
 
+    # must happen before the first CUDA allocation
+    setup_cuda_allocator(param.Hardware.torch_cuda_alloc_conf)
+
+    """Distributed (multi-GPU) training, only the main process (rank 0) logs and writes to disk"""
+    rank, world_size, local_rank = setup_distributed(local_rank)
+    is_main = rank == 0
+
     """Experiment ID"""
     if not debug:
         if param.InOut.checkpoint_init is None:
@@ -94,30 +109,35 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
         experiment_id = 'debug'
         from_ckpt = False
 
+    if world_size > 1:  # timestamps may differ between processes, use the one of the main process
+        experiment_id = broadcast_object(experiment_id)
+
     """Set up unique folder for experiment"""
     if not from_ckpt:
         experiment_path = Path(param.InOut.experiment_out) / Path(experiment_id)
     else:
         experiment_path = Path(param.InOut.checkpoint_init).parent
 
-    if not experiment_path.parent.exists():
-        experiment_path.parent.mkdir()
+    if is_main:
+        if not experiment_path.parent.exists():
+            experiment_path.parent.mkdir()
 
-    if not from_ckpt:
-        if debug:
-            experiment_path.mkdir(exist_ok=True)
-        else:
-            experiment_path.mkdir(exist_ok=False)
+        if not from_ckpt:
+            if debug:
+                experiment_path.mkdir(exist_ok=True)
+            else:
+                experiment_path.mkdir(exist_ok=False)
 
     model_out = experiment_path / Path('model.pt')
     ckpt_path = experiment_path / Path('ckpt.pt')
 
     # Backup the parameter file under the network output path with the experiments ID
-    param_backup_in = experiment_path / Path('param_run_in').with_suffix(param_file.suffix)
-    shutil.copy(param_file, param_backup_in)
+    if is_main:
+        param_backup_in = experiment_path / Path('param_run_in').with_suffix(param_file.suffix)
+        shutil.copy(param_file, param_backup_in)
 
-    param_backup = experiment_path / Path('param_run').with_suffix(param_file.suffix)
-    decode.utils.param_io.ParamHandling().write_params(param_backup, param)
+        param_backup = experiment_path / Path('param_run').with_suffix(param_file.suffix)
+        decode.utils.param_io.ParamHandling().write_params(param_backup, param)
 
     if debug:
         decode.utils.param_io.ParamHandling.convert_param_debug(param)
@@ -132,6 +152,10 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
     else:
         device = param.Hardware.device
 
+    if world_size > 1:  # one process per GPU
+        device = f'cuda:{local_rank}'
+        param.Hardware.device_simulation = device
+
     if torch.cuda.is_available():
         _, device_ix = decode.utils.hardware._specific_device_by_str(device)
         if device_ix is not None:
@@ -151,8 +175,16 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
 
     torch.set_num_threads(param.Hardware.torch_threads)
 
+    if param.Hardware.cuda_memory_fraction is not None and 'cuda' in device:
+        if hasattr(torch.cuda, 'set_per_process_memory_fraction'):  # available from pytorch 1.8 on
+            torch.cuda.set_per_process_memory_fraction(param.Hardware.cuda_memory_fraction,
+                                                       device=torch.device(device))
+        else:
+            print(f"Cannot limit the CUDA memory fraction with pytorch {torch.__version__} (requires >= 1.8). "
+                  f"Ignoring Hardware.cuda_memory_fraction.")
+
     """Setup Log System"""
-    if no_log:
+    if no_log or not is_main:
         logger = decode.neuralfitter.utils.logger.NoLog()
 
     else:
@@ -171,7 +203,7 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
     sim_train, sim_test = setup_random_simulation(param)
     ds_train, ds_test, model, model_ls, optimizer, criterion, lr_scheduler, grad_mod, post_processor, matcher, ckpt = \
         setup_trainer(sim_train, sim_test, logger, model_out, ckpt_path, device, param)
-    dl_train, dl_test = setup_dataloader(param, ds_train, ds_test)
+    dl_train, dl_test = setup_dataloader(param, ds_train, ds_test, distributed=world_size > 1)
 
     if from_ckpt:
         ckpt = decode.utils.checkpoint.CheckPoint.load(param.InOut.checkpoint_init)
@@ -197,12 +229,21 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
             threshold=param.HyperParameter.auto_restart_param.restart_treshold,
         )
 
+        model_train = wrap_distributed(model, local_rank) if world_size > 1 else model
+
+        # mixed precision is only supported on CUDA, the disabled scaler falls back to plain fp32
+        mixed_precision = param.HyperParameter.mixed_precision and torch.device(device).type == 'cuda'
+        grad_scaler = torch.cuda.amp.GradScaler(enabled=mixed_precision)
+
         for i in range(first_epoch, param.HyperParameter.epochs):
             logger.add_scalar('learning/learning_rate', optimizer.param_groups[0]['lr'], i)
 
+            if isinstance(dl_train.sampler, torch.utils.data.distributed.DistributedSampler):
+                dl_train.sampler.set_epoch(i)
+
             if i >= 1:
                 _ = decode.neuralfitter.train_val_impl.train(
-                    model=model,
+                    model=model_train,
                     optimizer=optimizer,
                     loss=criterion,
                     dataloader=dl_train,
@@ -210,7 +251,8 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
                     grad_mod=grad_mod,
                     epoch=i,
                     device=torch.device(device),
-                    logger=logger
+                    logger=logger,
+                    grad_scaler=grad_scaler
                 )
 
             val_loss, test_out = decode.neuralfitter.train_val_impl.test(
@@ -218,16 +260,25 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
                 loss=criterion,
                 dataloader=dl_test,
                 epoch=i,
-                device=torch.device(device))
+                device=torch.device(device),
+                mixed_precision=mixed_precision)
+
+            if world_size > 1:  # all processes must agree on the validation loss and on restarting
+                val_loss = all_reduce_mean(val_loss)
+                converged = all_reduce_mean(conv_check(test_out.loss[:, 0].mean(), i)) == 1.
+            else:
+                converged = conv_check(test_out.loss[:, 0].mean(), i)
 
-            if not conv_check(test_out.loss[:, 0].mean(), i):
+            if not converged:
                 print(f"The model will be reinitialized and retrained due to a pathological loss."
                       f"The max. allowed loss per emitter is {conv_check.threshold:.1f} vs."
                       f" {(test_out.loss[:, 0].mean() / conv_check.emitter_avg):.1f} (observed).")
 
+                model_ls.close()
+                ckpt.wait()  # the new trainer writes to the same checkpoint file
                 ds_train, ds_test, model, model_ls, optimizer, criterion, lr_scheduler, grad_mod, post_processor, matcher, ckpt = \
                     setup_trainer(sim_train, sim_test, logger, model_out, ckpt_path, device, param)
-                dl_train, dl_test = setup_dataloader(param, ds_train, ds_test)
+                dl_train, dl_test = setup_dataloader(param, ds_train, ds_test, distributed=world_size > 1)
 
                 converges = False
                 break
@@ -236,16 +287,18 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
                 converges = True
 
             """Post-Process and Evaluate"""
-            log_train_val_progress.post_process_log_test(loss_cmp=test_out.loss,
-                                                         loss_scalar=val_loss,
-                                                         x=test_out.x, y_out=test_out.y_out,
-                                                         y_tar=test_out.y_tar,
-                                                         weight=test_out.weight,
-                                                         em_tar=ds_test.emitter,
-                                                         px_border=-0.5, px_size=1.,
-                                                         post_processor=post_processor,
-                                                         matcher=matcher, logger=logger,
-                                                         step=i)
+            # only for logging, i.e. skip post-processing, matching and figure rendering if there is no logger
+            if is_main and not no_log:
+                log_train_val_progress.post_process_log_test(loss_cmp=test_out.loss,
+                                                             loss_scalar=val_loss,
+                                                             x=test_out.x, y_out=test_out.y_out,
+                                                             y_tar=test_out.y_tar,
+                                                             weight=test_out.weight,
+                                                             em_tar=ds_test.emitter,
+                                                             px_border=-0.5, px_size=1.,
+                                                             post_processor=post_processor,
+                                                             matcher=matcher, logger=logger,
+                                                             step=i)
 
             if i >= 1:
                 if isinstance(lr_scheduler, torch.optim.lr_scheduler.ReduceLROnPlateau):
@@ -253,13 +306,15 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
                 else:
                     lr_scheduler.step()
 
-            model_ls.save(model, None)
-            if no_log:
-                ckpt.dump(model.state_dict(), optimizer.state_dict(), lr_scheduler.state_dict(),
-                          step=i)
-            else:
-                ckpt.dump(model.state_dict(), optimizer.state_dict(), lr_scheduler.state_dict(),
-                          log=logger.logger[1].log_dict, step=i)
+            if is_main:
+                model_ls.save(model, None)
+                # written in the background while the next epoch is already running
+                if no_log:
+                    ckpt.dump(model.state_dict(), optimizer.state_dict(), lr_scheduler.state_dict(),
+                              step=i, blocking=False)
+                else:
+                    ckpt.dump(model.state_dict(), optimizer.state_dict(), lr_scheduler.state_dict(),
+                              log=logger.logger[1].log_dict, step=i, blocking=False)
 
             """Draw new samples Samples"""
             if param.Simulation.mode in 'acquisition':
@@ -267,6 +322,9 @@ def live_engine_setup(param_file: str, device_overwrite: str = None, debug: bool
             elif param.Simulation.mode != 'samples':
                 raise ValueError
 
+    model_ls.close()  # flush pending saves
+    ckpt.wait()
+
     if converges:
         print("Training finished after reaching maximum number of epochs.")
     else:
@@ -289,10 +347,10 @@ def setup_trainer(simulator_train, simulator_test, logger, model_out, ckpt_path,
     model = model.parse(param)
 
     model_ls = decode.utils.model_io.LoadSaveModel(model,
-                                                   output_file=model_out)
+                                                   output_file=model_out,
+                                                   async_save=True)
 
-    model = model_ls.load_init()
-    model = model.to(torch.device(device))
+    model = model_ls.load_init(torch.device(device))
 
     # Small collection of optimisers
     optimizer_available = {
@@ -301,7 +359,8 @@ def setup_trainer(simulator_train, simulator_test, logger, model_out, ckpt_path,
     }
 
     optimizer = optimizer_available[param.HyperParameter.optimizer]
-    optimizer = optimizer(model.parameters(), **param.HyperParameter.opt_param)
+    optimizer = optimizer(model.parameters(),
+                          **{**optimizer_kernel_options(optimizer, device), **param.HyperParameter.opt_param})
 
     """Loss function."""
     criterion = decode.neuralfitter.loss.GaussianMMLoss(
@@ -457,14 +516,37 @@ def setup_trainer(simulator_train, simulator_test, logger, model_out, ckpt_path,
     return train_ds, test_ds, model, model_ls, optimizer, criterion, lr_scheduler, grad_mod, post_processor, matcher, checkpoint
 
 
-def setup_dataloader(param, train_ds, test_ds=None):
-    """Set's up dataloader"""
+def optimizer_kernel_options(optimizer: type, device) -> dict:
+    """
+    Optimizer options that collapse the per-parameter update loop into few kernel launches, as far as supported by
+    the installed pytorch version (fused kernels on CUDA, multi-tensor 'foreach' implementation otherwise).
+
+    Args:
+        optimizer: optimizer class
+        device: device the model parameters live on
+
+    """
+    opt_args = inspect.signature(optimizer).parameters
+
+    if 'fused' in opt_args and torch.device(device).type == 'cuda':
+        return {'fused': True}
+    elif 'foreach' in opt_args:
+        return {'foreach': True}
+
+    return {}
+
+
+def setup_dataloader(param, train_ds, test_ds=None, distributed: bool = False):
+    """Set's up dataloader (the training set is sharded over the processes if distributed)"""
+
+    train_sampler = torch.utils.data.distributed.DistributedSampler(train_ds, shuffle=True) if distributed else None
 
     train_dl = torch.utils.data.DataLoader(
         dataset=train_ds,
         batch_size=param.HyperParameter.batch_size,
         drop_last=True,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=param.Hardware.num_worker_train,
         pin_memory=True,
         collate_fn=decode.neuralfitter.utils.dataloader_customs.smlm_collate)
@@ -477,7 +559,7 @@ def setup_dataloader(param, train_ds, test_ds=None):
             drop_last=False,
             shuffle=False,
             num_workers=param.Hardware.num_worker_train,
-            pin_memory=False,
+            pin_memory=True,
             collate_fn=decode.neuralfitter.utils.dataloader_customs.smlm_collate)
     else:
 
@@ -486,11 +568,78 @@ def setup_dataloader(param, train_ds, test_ds=None):
     return train_dl, test_dl
 
 
+def setup_cuda_allocator(conf: Optional[str]):
+    """
+    Configures pytorch's CUDA caching allocator (e.g. 'max_split_size_mb:512' to reduce fragmentation over the
+    epochs). Has no effect if the allocator has already been configured via the environment or is already in use.
+
+    Args:
+        conf: allocator configuration in the format of the PYTORCH_CUDA_ALLOC_CONF environment variable
+
+    """
+    if conf is None:
+        return
+
+    if torch.cuda.is_initialized():
+        print("CUDA is already initialised, cannot configure the CUDA allocator anymore.")
+        return
+
+    os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', conf)
+
+
+def setup_distributed(local_rank: Optional[int] = None) -> Tuple[int, int, Optional[int]]:
+    """
+    Initialises the process group if launched as multi-process job (e.g. by torch.distributed.launch), i.e. when
+    the environment specifies a world size larger than one.
+
+    Args:
+        local_rank: process index on this node, falls back to the environment variable LOCAL_RANK
+
+    Returns:
+        rank, world size, local rank
+
+    """
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if world_size <= 1:
+        return 0, 1, None
+
+    if local_rank is None:
+        local_rank = int(os.environ['LOCAL_RANK'])
+
+    if not torch.cuda.is_available():
+        raise RuntimeError("Distributed training is only supported on CUDA devices.")
+
+    torch.cuda.set_device(local_rank)
+    torch.distributed.init_process_group(backend='nccl')
+
+    return torch.distributed.get_rank(), world_size, local_rank
+
+
+def wrap_distributed(model: torch.nn.Module, local_rank: int) -> torch.nn.parallel.DistributedDataParallel:
+    """Replicates the model over the processes. Gradients are all-reduced (in buckets) during the backward pass."""
+    return torch.nn.parallel.DistributedDataParallel(model, device_ids=[local_rank], output_device=local_rank,
+                                                     gradient_as_bucket_view=True)
+
+
+def broadcast_object(obj, src: int = 0):
+    """Broadcasts a picklable object from the source process to all others."""
+    obj = [obj]
+    torch.distributed.broadcast_object_list(obj, src=src)
+    return obj[0]
+
+
+def all_reduce_mean(val) -> float:
+    """Averages a scalar over all processes."""
+    val = torch.tensor(float(val), device=torch.cuda.current_device())
+    torch.distributed.all_reduce(val)
+    return val.item() / torch.distributed.get_world_size()
+
+
 def main():
     args = parse_args()
     live_engine_setup(args.param_file, args.device, args.debug, args.no_log,
                       args.num_worker_override, args.log_folder,
-                      args.log_comment)
+                      args.log_comment, args.local_rank)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
 import torch
 import time
-from typing import Union
+from typing import Iterable, Optional, Union
 
 from tqdm import tqdm
 from collections import namedtuple
@@ -9,111 +9,139 @@ from .utils import log_train_val_progress
 from ..evaluation.utils import MetricMeter
 
 
-def train(model, optimizer, loss, dataloader, grad_rescale, grad_mod, epoch, device, logger) -> float:
+_log_interval = 10  # batches between progress updates (i.e. host-device syncs) during training
+
+
+def train(model, optimizer, loss, dataloader, grad_rescale, grad_mod, epoch, device, logger,
+          grad_scaler: Optional[torch.cuda.amp.GradScaler] = None) -> float:
 
     """Some Setup things"""
     model.train()
-    tqdm_enum = tqdm(dataloader, total=len(dataloader), smoothing=0.)  # progress bar enumeration
+    if grad_scaler is None:  # disabled scaler is a no-op, i.e. plain fp32 training
+        grad_scaler = torch.cuda.amp.GradScaler(enabled=False)
+
+    n_batches = len(dataloader)  # may not be free for wrapped / distributed loaders, hence only once
+    tqdm_enum = tqdm(dataloader, total=n_batches, smoothing=0.)  # progress bar enumeration
     t0 = time.time()
-    loss_epoch = MetricMeter()
+    t_log = t0
+    loss_batch = torch.zeros(n_batches, device=device)  # kept on device to avoid a sync per batch
 
     """Actual Training"""
-    for batch_num, (x, y_tar, weight) in enumerate(tqdm_enum):  # model input (x), target (yt), weights (w)
+    # model input (x), target (yt), weights (w)
+    for batch_num, (x, y_tar, weight) in enumerate(prefetch_device(tqdm_enum, device)):
 
         """Monitor time to get the data"""
         t_data = time.time() - t0
 
-        """Ship the data to the correct device"""
-        x, y_tar, weight = ship_device([x, y_tar, weight], device)
-        
-        """Forward the data"""
-        y_out = model(x)
+        """Forward the data (in mixed precision if the grad scaler is enabled)"""
+        with torch.cuda.amp.autocast(enabled=grad_scaler.is_enabled()):
+            y_out = model(x)
 
         """Reset the optimiser, compute the loss and backprop it"""
-        loss_val = loss(y_out, y_tar, weight)
+        loss_val = loss(y_out.float(), y_tar, weight)  # loss always in fp32
 
         if grad_rescale:  # rescale gradients so that they are in the same order for the last layer
-            weight, _, _ = model.rescale_last_layer_grad(loss_val, optimizer)
+            model_core = model.module if isinstance(model, torch.nn.parallel.DistributedDataParallel) else model
+            # head gradients of the scaled loss, otherwise small ones underflow in fp16 and their channel gets weight 0.
+            # The (normalised) weights are invariant to the scale factor, i.e. there is nothing to unscale.
+            weight, _, _ = model_core.rescale_last_layer_grad(grad_scaler.scale(loss_val), optimizer)
             loss_val = loss_val * weight
 
-        optimizer.zero_grad()
-        loss_val.mean().backward()
+        optimizer.zero_grad(set_to_none=True)  # drop instead of zero-filling the gradients
+        grad_scaler.scale(loss_val.mean()).backward()
 
         """Gradient Modification"""
         if grad_mod:
+            grad_scaler.unscale_(optimizer)  # clip the true gradients, not the scaled ones
             torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=0.03, norm_type=2)
 
         """Update model parameters"""
-        optimizer.step()
+        grad_scaler.step(optimizer)
+        grad_scaler.update()
 
-        """Monitor overall time"""
-        t_batch = time.time() - t0
-
-        """Logging"""
-        loss_mean, loss_cmp = loss.log(loss_val)  # compute individual loss components
+        """Logging (synchronises with the device only every couple of batches)"""
+        loss_batch[batch_num] = loss_val.detach().mean()
         del loss_val
-        loss_epoch.update(loss_mean)
-        tqdm_enum.set_description(f"E: {epoch} - t: {t_batch:.2} - t_dat: {t_data:.2} - L: {loss_mean:.3}")
+
+        if batch_num % _log_interval == 0:
+            # mean over the batches since the last update, reduced on the device and fetched with a single sync
+            n_log = min(batch_num + 1, _log_interval)
+            loss_mean = loss_batch[batch_num + 1 - n_log:batch_num + 1].mean().item()
+
+            """Monitor overall time (averaged over the batches since the last sync)"""
+            t_batch = (time.time() - t_log) / n_log
+            t_log = time.time()
+
+            tqdm_enum.set_description(f"E: {epoch} - t: {t_batch:.2} - t_dat: {t_data:.2} - L: {loss_mean:.3}")
 
         t0 = time.time()
 
+    loss_batch = loss_batch.cpu()  # single sync for the whole epoch
+    loss_epoch = MetricMeter(vals=loss_batch[~torch.isnan(loss_batch)])
+
     log_train_val_progress.log_train(loss_p_batch=loss_epoch.vals, loss_mean=loss_epoch.mean, logger=logger, step=epoch)
 
     return loss_epoch.mean
 
 
+# inference mode disables autograd bookkeeping entirely (torch >= 1.9), fall back to no_grad otherwise
+_inference_mode = torch.inference_mode if hasattr(torch, 'inference_mode') else torch.no_grad
+
 _val_return = namedtuple("network_output", ["loss", "x", "y_out", "y_tar", "weight", "em_tar"])
 
 
-def test(model, loss, dataloader, epoch, device):
+def test(model, loss, dataloader, epoch, device, mixed_precision: bool = False):
 
     """Setup"""
-    x_ep, y_out_ep, y_tar_ep, weight_ep, em_tar_ep = [], [], [], [], []  # store things epoche wise (_ep)
-    loss_cmp_ep = []
+    n_samples = len(dataloader.dataset)
+    loss_cmp_ep, x_ep, y_out_ep = [_HostGather(n_samples) for _ in range(3)]  # store things epoche wise (_ep)
 
     model.eval()
-    tqdm_enum = tqdm(dataloader, total=len(dataloader), smoothing=0.)  # progress bar enumeration
+    n_batches = len(dataloader)
+    tqdm_enum = tqdm(dataloader, total=n_batches, smoothing=0.)  # progress bar enumeration
 
     t0 = time.time()
 
     """Testing"""
-    with torch.no_grad():
-        for batch_num, (x, y_tar, weight) in enumerate(tqdm_enum):
-
-            """Ship the data to the correct device"""
-            x, y_tar, weight = ship_device([x, y_tar, weight], device)
+    for batch_num, (x, y_tar, weight) in enumerate(prefetch_device(tqdm_enum, device)):
 
-            """
-            Forward the data.
-            """
-            y_out = model(x)
+        """
+        Forward the data.
+        """
+        with _inference_mode():
+            with torch.cuda.amp.autocast(enabled=mixed_precision):
+                y_out = model(x)
 
+            y_out = y_out.float()
             loss_val = loss(y_out, y_tar, weight)
 
-            t_batch = time.time() - t0
+        t_batch = time.time() - t0
 
-            """Logging and temporary save"""
-            tqdm_enum.set_description(f"(Test) E: {epoch} - T: {t_batch:.2}")
+        """Logging and temporary save"""
+        tqdm_enum.set_description(f"(Test) E: {epoch} - T: {t_batch:.2}")
 
-            loss_cmp_ep.append(loss_val.detach().cpu())
-            x_ep.append(x.cpu())
-            y_out_ep.append(y_out.detach().cpu())
+        # outside of inference mode, such that the gathered outputs are regular tensors
+        loss_cmp_ep.append(loss_val)
+        x_ep.append(x)
+        y_out_ep.append(y_out)
 
     """Epoch-Wise Merging"""
-    loss_cmp_ep = torch.cat(loss_cmp_ep, 0)
-    x_ep = torch.cat(x_ep, 0)
-    y_out_ep = torch.cat(y_out_ep, 0)
+    loss_cmp_ep = loss_cmp_ep.result()
+    x_ep = x_ep.result()
+    y_out_ep = y_out_ep.result()
 
     return loss_cmp_ep.mean(), _val_return(loss=loss_cmp_ep, x=x_ep, y_out=y_out_ep, y_tar=None, weight=None, em_tar=None)
 
 
-def ship_device(x, device: Union[str, torch.device]):
+def ship_device(x, device: Union[str, torch.device], non_blocking: bool = False):
     """
     Ships the input to a pytorch compatible device (e.g. CUDA)
 
     Args:
         x:
         device:
+        non_blocking: asynchronous copy w.r.t. the host. Only effective if the source lives in pinned memory,
+         i.e. use a DataLoader with `pin_memory=True`
 
     Returns:
         x
@@ -123,11 +151,130 @@ def ship_device(x, device: Union[str, torch.device]):
         return x
 
     elif isinstance(x, torch.Tensor):
-        return x.to(device)
+        return x.to(device, non_blocking=non_blocking)
 
     elif isinstance(x, (tuple, list)):
-        x = [ship_device(x_el, device) for x_el in x]  # a nice little recursion that worked at the first try
+        # a nice little recursion that worked at the first try
+        x = [ship_device(x_el, device, non_blocking) for x_el in x]
         return x
 
     elif device != 'cpu':
         raise NotImplementedError(f"Unsupported data type for shipping from host to CUDA device.")
+
+
+class _HostGather:
+    """
+    Gathers batches (along the first dimension) into a preallocated host tensor. Batches on a CUDA device are copied
+    asynchronously into a small ring of pinned staging buffers and from there into the (pageable) output once their
+    copy has finished, i.e. the host waits for the copy of a batch only when its staging buffer is needed again.
+    """
+
+    def __init__(self, n: int, n_slots: int = 2):
+        """
+
+        Args:
+            n: max. number of samples, i.e. size of the first dimension of the output
+            n_slots: number of pinned staging buffers
+
+        """
+        self._n = n
+        self._n_slots = n_slots
+        self._out = None
+        self._offset = 0
+        self._pending = []  # (staging buffer, number of samples, copy done event, offset in output)
+        self._free = []
+
+    def append(self, x: torch.Tensor):
+        x = x.detach()
+        if self._out is None:
+            self._out = torch.empty((self._n, *x.size()[1:]), dtype=x.dtype)
+
+        n, offset = x.size(0), self._offset
+        self._offset += n
+
+        if not x.is_cuda:
+            self._out[offset:offset + n] = x
+            return
+
+        if len(self._pending) == self._n_slots:
+            self._flush()
+
+        buf = self._free.pop() if self._free else None
+        if buf is None or buf.size()[1:] != x.size()[1:] or buf.size(0) < n:
+            buf = torch.empty(x.size(), dtype=x.dtype, pin_memory=True)
+
+        buf[:n].copy_(x, non_blocking=True)
+        done = torch.cuda.Event()
+        done.record()
+        self._pending.append((buf, n, done, offset))
+
+    def _flush(self):
+        buf, n, done, offset = self._pending.pop(0)
+        done.synchronize()
+        self._out[offset:offset + n] = buf[:n]
+        self._free.append(buf)
+
+    def result(self) -> torch.Tensor:
+        while self._pending:
+            self._flush()
+
+        return self._out[:self._offset]
+
+
+def _record_stream(x, stream: torch.cuda.Stream):
+    """
+    Marks (possibly nested) tensors as in use by the specified stream, such that the caching allocator does not hand
+    out their memory while the stream still works on them.
+    """
+    if isinstance(x, torch.Tensor):
+        x.record_stream(stream)
+
+    elif isinstance(x, (tuple, list)):
+        for x_el in x:
+            _record_stream(x_el, stream)
+
+
+def prefetch_device(batches: Iterable, device: Union[str, torch.device]):
+    """
+    Ships the batches of an iterable to the device. For CUDA devices the host to device copy of batch i+1 is issued
+    on a separate stream while batch i is being processed, i.e. data transfer and compute overlap.
+    For this to be effective the batches must come from pinned memory (DataLoader with `pin_memory=True`),
+    otherwise the copy falls back to a synchronous one.
+
+    Args:
+        batches: iterable of (nested lists / tuples of) tensors, e.g. a DataLoader
+        device: target device
+
+    """
+    device = torch.device(device)
+
+    if device.type != 'cuda':
+        for batch in batches:
+            yield ship_device(batch, device)
+        return
+
+    copy_stream = torch.cuda.Stream(device=device)
+    pending = None  # two slot ring, i.e. the batch currently processed and the one being copied
+
+    for batch in batches:
+        with torch.cuda.stream(copy_stream):
+            batch = ship_device(batch, device, non_blocking=True)
+            ready = torch.cuda.Event()
+            ready.record(copy_stream)
+
+        if pending is not None:
+            yield _consume_prefetched(*pending, device)
+
+        pending = (batch, ready)
+
+    if pending is not None:
+        yield _consume_prefetched(*pending, device)
+
+
+def _consume_prefetched(batch, ready: torch.cuda.Event, device: torch.device):
+    """Lets the compute stream wait for the copy of the batch before it is used."""
+    stream = torch.cuda.current_stream(device)
+    stream.wait_event(ready)
+    _record_stream(batch, stream)
+
+    return batch
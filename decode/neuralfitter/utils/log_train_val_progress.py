@@ -1,4 +1,5 @@
 import warnings
+from typing import Optional
 
 import matplotlib.pyplot as plt
 import torch
@@ -12,7 +13,34 @@ from decode.plot import frame_coord
 from decode.evaluation import evaluation
 
 
-def log_frames(x, y_out, y_tar, weight, em_out, em_tar, tp, tp_match, logger, step, colorbar=True):
+def frame_to_image(frame: torch.Tensor, pos: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    Converts a frame to an RGB image tensor that can be logged directly (i.e. without rendering a matplotlib figure).
+    According to the convention (x to the right, y down) the frame is transposed.
+
+    Args:
+        frame: frame of size X x Y
+        pos: emitter positions in px (N x 2 or N x 3), marked red in the image
+
+    Returns:
+        image of size 3 x Y x X with values in [0, 1]
+
+    """
+    frame = frame.detach().cpu().float().t()
+
+    f_min, f_max = frame.min(), frame.max()
+    frame = (frame - f_min) / (f_max - f_min) if f_max > f_min else torch.zeros_like(frame)
+    img = frame.unsqueeze(0).repeat(3, 1, 1)
+
+    if pos is not None and len(pos) >= 1:
+        ix = pos[:, :2].round().long()
+        ix = ix[(ix[:, 0] >= 0) & (ix[:, 0] < img.size(2)) & (ix[:, 1] >= 0) & (ix[:, 1] < img.size(1))]
+        img[:, ix[:, 1], ix[:, 0]] = torch.tensor([1., 0., 0.]).unsqueeze(1)
+
+    return img
+
+
+def log_frames(x, y_out, y_tar, weight, em_out, em_tar, tp, tp_match, logger, step):
 
     r_ix = torch.randint(0, len(x), (1, )).long().item()
     assert x.dim() == 4
@@ -29,17 +57,14 @@ def log_frames(x, y_out, y_tar, weight, em_out, em_tar, tp, tp_match, logger, st
     em_tp = tp.get_subset_frame(r_ix, r_ix)
     em_tp_match = tp_match.get_subset_frame(r_ix, r_ix)
 
+    # raw frames are logged as images, only the emitter comparisons below are rendered by matplotlib
     # loop over all input channels
     for i, xc in enumerate(x):
-        f_input = plt.figure()
-        frame_coord.PlotFrameCoord(xc, pos_tar=em_tar.xyz_px, plot_colorbar_frame=colorbar).plot()
-        logger.add_figure('input/raw_input_ch_' + str(i), f_input, step)
+        logger.add_image('input/raw_input_ch_' + str(i), frame_to_image(xc, em_tar.xyz_px), step)
 
     # loop over all output channels
     for i, yc in enumerate(y_out):
-        f_out = plt.figure()
-        frame_coord.PlotFrameCoord(yc, plot_colorbar_frame=colorbar).plot()
-        logger.add_figure('output/raw_output_ch_' + str(i), f_out, step)
+        logger.add_image('output/raw_output_ch_' + str(i), frame_to_image(yc), step)
 
     # record tar / output emitters
     tar_ch = (x.size(0) - 1) // 2
@@ -65,16 +90,12 @@ def log_frames(x, y_out, y_tar, weight, em_out, em_tar, tp, tp_match, logger, st
     # loop over all target channels
     if y_tar is not None:
         for i, yct in enumerate(y_tar):
-            f_tar = plt.figure()
-            frame_coord.PlotFrameCoord(yct, plot_colorbar_frame=colorbar).plot()
-            logger.add_figure('target/target_ch_' + str(i), f_tar, step)
+            logger.add_image('target/target_ch_' + str(i), frame_to_image(yct), step)
 
     # loop over all weight channels
     if weight is not None:
         for i, w in enumerate(weight):
-            f_w = plt.figure()
-            frame_coord.PlotFrameCoord(w, plot_colorbar_frame=colorbar).plot()
-            logger.add_figure('weight/weight_ch_' + str(i), f_w, step)
+            logger.add_image('weight/weight_ch_' + str(i), frame_to_image(w), step)
 
     # plot dist of probability channel
     # ToDo: Histplots seem to cause trouble with memory. Deactivated for now. If reactivate: change back to distplot
@@ -1,13 +1,12 @@
+import functools
 import math
 import warnings
 from abc import ABC, abstractmethod
 from typing import Tuple, Union
 
-import numpy as np
 import spline  # cubic spline implementation
 import torch
 
-from decode.generic import slicing as gutil
 import decode.generic.utils
 
 
@@ -108,12 +107,25 @@ class PSF(ABC):
         Returns:
             frames (torch.Tensor): N x H x W, stacked frames
         """
-        ix_split, n_splits = gutil.ix_split(frame_ix, ix_min=ix_low, ix_max=ix_high)
-        if weight is not None:
-            frames = [self._forward_single_frame(xyz[ix_split[i]], weight[ix_split[i]]) for i in range(n_splits)]
-        else:
-            frames = [self._forward_single_frame(xyz[ix_split[i]], None) for i in range(n_splits)]
-        frames = torch.stack(frames, 0)
+        n_frames = ix_high - ix_low + 1
+
+        """Sort once by frame index, such that the emitters of each frame are a contiguous slice (no mask per frame)"""
+        frame_ix, order = torch.sort(frame_ix)
+        xyz = xyz[order]
+        weight = weight[order] if weight is not None else None
+
+        bounds = torch.searchsorted(
+            frame_ix, torch.arange(ix_low, ix_high + 2, dtype=frame_ix.dtype, device=frame_ix.device)).tolist()
+
+        """Write the frames directly into the preallocated output"""
+        frames = None
+        for i in range(n_frames):
+            ix = slice(bounds[i], bounds[i + 1])
+            frame = self._forward_single_frame(xyz[ix], weight[ix] if weight is not None else None)
+
+            if frames is None:
+                frames = frame.new_zeros((n_frames, *frame.size()))
+            frames[i] = frame
 
         return frames
 
@@ -163,8 +175,8 @@ class DeltaPSF(PSF):
 
         """
 
-        x_ix = np.searchsorted(self._bin_x, xy[:, 0], side='right') - 1
-        y_ix = np.searchsorted(self._bin_y, xy[:, 1], side='right') - 1
+        x_ix = torch.searchsorted(self._bin_x, xy[:, 0].contiguous().to(self._bin_x.dtype), right=True) - 1
+        y_ix = torch.searchsorted(self._bin_y, xy[:, 1].contiguous().to(self._bin_y.dtype), right=True) - 1
 
         if raise_outside:
             if (~((x_ix >= 0) * (x_ix <= len(self._bin_x) - 2) *
@@ -199,9 +211,9 @@ class DeltaPSF(PSF):
         x_ix, y_ix = self.search_bin_index(xyz[mask], raise_outside=True)
         n_ix = frame_ix[mask].long()
 
-        """Generate frames"""
+        """Generate frames, all emitters are written by a single scatter"""
         frames = torch.zeros((ix_high - ix_low + 1, *self.img_shape))
-        frames[n_ix, x_ix, y_ix] = weight[mask]
+        frames.index_put_((n_ix, x_ix, y_ix), weight[mask].to(frames.dtype))
 
         return frames
 
@@ -433,10 +445,12 @@ class CubicSplinePSF(PSF):
         return spline.cuda_compiled
 
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def cuda_is_available() -> bool:
         """
         This is a dummy method to check whether CUDA is available without the need to init the class. I wonder
         whether Python has 'static properties'?
+        The result is cached since it does not change during the lifetime of the process.
 
         """
         return spline.cuda_is_available()
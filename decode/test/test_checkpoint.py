@@ -1,5 +1,6 @@
 from pathlib import Path
 import pytest
+import torch
 
 from ..utils import checkpoint
 
@@ -17,3 +18,24 @@ class TestCheckpoint:
 
         ckpt_re = checkpoint.CheckPoint.load(ckpt.path)
         assert ckpt.__dict__ == ckpt_re.__dict__
+
+    def test_save_load_non_blocking(self, ckpt):
+        model_state = {'weight': torch.rand(5)}
+        weight = model_state['weight'].clone()
+        ckpt.dump(model_state, {'state': {}}, {'lr': 1.}, 42, blocking=False)
+
+        model_state['weight'] += 1.  # changes after the dump must not end up in the file
+        ckpt.wait()
+
+        ckpt_re = checkpoint.CheckPoint.load(ckpt.path)
+        assert (ckpt_re.model_state['weight'] == weight).all()
+        assert ckpt_re.step == 42
+
+    def test_save_non_blocking_error(self, tmpdir):
+        ckpt = checkpoint.CheckPoint(Path(tmpdir) / 'not_existing' / 'ckpt.pt')
+        ckpt.dump('a', 'b', 'c', 42, blocking=False)
+
+        with pytest.raises((RuntimeError, OSError)):  # error of the background write surfaces in the main thread
+            ckpt.wait()
+
+        ckpt.wait()  # raised only once
@@ -35,3 +35,19 @@ class TestMetricMeter:
         assert tutil.tens_almeq((mm0 / mm1).vals, mm0.vals / mm1.vals)
         assert tutil.tens_almeq((mm0 / 42.).vals, mm0.vals / 42.)
         assert tutil.tens_almeq((mm0 ** 2).vals, mm0.vals ** 2)
+
+    def test_update(self):
+        m = decode.evaluation.utils.MetricMeter()
+
+        vals = torch.rand(100)
+        vals[5] = float('nan')
+        for v in vals:
+            m.update(v)
+
+        assert m.count == 99
+        assert m.val == pytest.approx(vals[-1].item())
+        assert tutil.tens_almeq(m.vals, vals[~torch.isnan(vals)])
+        assert m.mean == pytest.approx(vals[~torch.isnan(vals)].mean().item())
+
+        m.reset()
+        assert m.count == 0
@@ -1,3 +1,4 @@
+import json
 import os
 import time
 
@@ -39,9 +40,262 @@ def test_save(model_interface, unet):
     if not exists:
         pytest.fail("Model could not be found after saving.")
 
-    os.remove(decode_root + 'decode/test/assets/test_load_save_0.pt')
-    os.remove(decode_root + 'decode/test/assets/test_load_save_1.pt')
+    for f in ('test_load_save_0.pt', 'test_load_save_1.pt'):
+        os.remove(decode_root + 'decode/test/assets/' + f)
+        os.remove(io_model._hash_cache_path(decode_root + 'decode/test/assets/' + f))
 
 
-def test_load_init(model_interface):
-    model_interface.load_init(decode_root + 'decode/test/assets/test_load_save_0.pt')
+def test_load_init(unet, tmpdir):
+    f = tmpdir / 'test_load_init.pt'
+    torch.save(unet.state_dict(), str(f))
+
+    model = io_model.LoadSaveModel(unet, output_file=None, input_file=f).load_init('cpu')
+    assert not model.training
+
+
+def test_hash_model(tmpdir):
+    f = tmpdir / 'dummy.pt'
+    torch.save({'a': torch.rand(1000)}, str(f))
+
+    h = io_model.hash_model(f, cache=False)
+    assert h == io_model.hash_model(f, cache=False), "Hash must be deterministic."
+
+    torch.save({'a': torch.rand(1000)}, str(f))
+    assert h != io_model.hash_model(f, cache=False), "Hash must change with the file's content."
+
+
+def test_hash_model_cache(tmpdir):
+    f = tmpdir / 'dummy.pt'
+    torch.save({'a': torch.rand(1000)}, str(f))
+
+    h = io_model.hash_model(f)
+    f_cache = io_model._hash_cache_path(f)
+    assert f_cache.is_file()
+    assert h == io_model.hash_model(f, cache=False)
+
+    # an unchanged file is served from the cache
+    f_cache.write_text(f"{io_model._hash_cache_key(f)}\ndummy_hash\n")
+    assert io_model.hash_model(f) == 'dummy_hash'
+
+    # a changed file is rehashed (different size, since the mtime resolution depends on the file system)
+    torch.save({'a': torch.rand(2000)}, str(f))
+    assert io_model.hash_model(f) == io_model.hash_model(f, cache=False) != 'dummy_hash'
+
+
+@pytest.mark.parametrize("fname", ['warmstart.pt', 'warmstart.bin'])  # pickled .bin file, i.e. without .meta file
+def test_load_init_warmstart(fname, tmpdir):
+    f = tmpdir / fname
+    model_ref = torch.nn.Linear(10, 2)
+    torch.save(model_ref.state_dict(), str(f))
+
+    model = io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, input_file=f).load_init('cpu')
+
+    assert (model.weight == model_ref.weight).all()
+    assert (model.bias == model_ref.bias).all()
+    assert model.hash == io_model.hash_model(f, cache=False)
+
+
+@pytest.mark.parametrize("save_format,crc32,direct_io", [('pt', True, False), ('pt', False, False),
+                                                          ('pt', True, True), ('safetensors', True, False),
+                                                          ('safetensors', True, True), ('raw', True, False),
+                                                          ('raw', True, True)])
+def test_save_load_format(save_format, crc32, direct_io, tmpdir):
+    if save_format == 'safetensors' and not io_model._safetensors_available:
+        pytest.skip("safetensors not installed.")
+
+    model_ref = torch.nn.Linear(10, 2)
+    io_model.LoadSaveModel(model_ref, output_file=tmpdir / 'model.pt', save_format=save_format,
+                           crc32=crc32, direct_io=direct_io).save(model_ref)
+
+    f = tmpdir / ('model_0' + io_model.LoadSaveModel._save_formats[save_format])
+    assert f.isfile()
+
+    # hashed while writing
+    assert io_model._read_hash_cache(f, io_model._hash_cache_key(f)) == io_model.hash_model(f, cache=False)
+
+    model = io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, input_file=f).load_init('cpu')
+    assert (model.weight == model_ref.weight).all()
+    assert (model.bias == model_ref.bias).all()
+
+
+def test_torch_save_config():
+    config = pytest.importorskip('torch.utils.serialization').config
+    if not hasattr(config.save, 'compute_crc32'):
+        pytest.skip("Serialisation config of this torch version does not know the option.")
+
+    crc32 = config.save.compute_crc32
+    with io_model._torch_save_config(crc32=not crc32):
+        assert config.save.compute_crc32 is not crc32
+
+    assert config.save.compute_crc32 is crc32, "Global config must be restored."
+
+
+def test_save_async(tmpdir):
+    model = torch.nn.Linear(10, 2)
+    model_ls = io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', max_files=1, async_save=True)
+
+    for _ in range(5):
+        with torch.no_grad():
+            model.weight += 1.
+        model_ls.save(model)
+    model_ls.close()
+
+    # last state must have been written, even though intermediate ones may have been dropped
+    state_dict = torch.load(str(tmpdir / 'model_0.pt'))
+    assert (state_dict['weight'] == model.weight).all()
+
+    # after closing saves are blocking
+    model_ls.save(model)
+    assert (tmpdir / 'model_0.pt').isfile()
+
+
+def test_save_async_error(tmpdir):
+    model = torch.nn.Linear(10, 2)
+    model_ls = io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', async_save=True)
+
+    def write_fail(state_dict, fname):
+        raise OSError("Disk full.")
+
+    model_ls._write = write_fail
+    model_ls.save(model)
+    model_ls._queue.join()
+
+    # raised on the next save before a staging buffer is taken, i.e. all buffers are back in the pool
+    with pytest.raises(OSError):
+        model_ls.save(model)
+    assert len(model_ls._staging._free) == 1
+
+    model_ls.close()
+
+
+@pytest.mark.parametrize("n", [0, 1, 4096, 5000, 2 ** 23 + 1])
+def test_direct_writer(n, tmpdir):
+    data = os.urandom(n)
+    with io_model._open_write(tmpdir / 'dummy.bin', direct=True) as f:
+        f.write(data[:n // 3])
+        f.write(data[n // 3:])
+
+    assert (tmpdir / 'dummy.bin').read_binary() == data
+
+
+def test_dump_load_raw(tmpdir):
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.BatchNorm2d(4))
+    state_dict = model.state_dict()
+
+    io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', save_format='raw').save(model)
+    assert {p.basename for p in tmpdir.listdir()} == {'model_0.bin', 'model_0.meta',
+                                                      'model_0.bin' + io_model._hash_suffix}
+
+    meta = json.loads((tmpdir / 'model_0.meta').read_text('utf-8'))
+    assert all(t['offset'] % io_model._raw_alignment == 0 for t in meta['tensors'].values())
+
+    for f in ('model_0.bin', 'model_0.meta'):
+        state_dict_load = io_model._load_raw(tmpdir / f)
+
+        assert state_dict_load.keys() == state_dict.keys()
+        for k, v in state_dict.items():
+            assert v.dtype == state_dict_load[k].dtype
+            assert v.shape == state_dict_load[k].shape  # incl. 0-d tensors, e.g. num_batches_tracked
+            assert (v == state_dict_load[k]).all()
+        assert state_dict_load._metadata == state_dict._metadata
+
+    # copy on write, i.e. the file is not altered
+    state_dict_load['0.weight'] += 1.
+    assert (io_model._load_raw(tmpdir / 'model_0.bin')['0.weight'] == state_dict['0.weight']).all()
+
+
+@pytest.mark.parametrize("device", ['cpu', pytest.param('cuda', marks=pytest.mark.skipif(
+    not torch.cuda.is_available(), reason="CUDA not available."))])
+def test_host_staging(device):
+    model = torch.nn.Sequential(torch.nn.Conv2d(3, 4, 3), torch.nn.BatchNorm2d(4)).to(device)
+    state_dict = model.state_dict()
+
+    staging = io_model._HostStaging(state_dict)
+    assert staging.matches(state_dict)
+    assert not staging.matches(torch.nn.Linear(3, 4).to(device).state_dict())
+
+    buffers = staging.acquire()
+    state_dict_host = staging.copy(state_dict, buffers)
+
+    assert state_dict_host.keys() == state_dict.keys()
+    assert state_dict_host._metadata == state_dict._metadata
+    for k, v in state_dict.items():
+        assert state_dict_host[k].device == torch.device('cpu')
+        assert (state_dict_host[k] == v.cpu()).all()
+
+    # snapshot, i.e. independent of the model
+    with torch.no_grad():
+        model[0].weight += 1.
+    assert (state_dict_host['0.weight'] != model[0].weight.cpu()).all()
+
+    # released buffers are reused, buffers in use are not
+    assert staging.acquire() is not buffers
+    staging.release(buffers)
+    assert staging.acquire() is buffers
+
+
+@pytest.mark.parametrize("max_files,n_expct", [(1, 1), (2, 2), (None, 4), (-1, 4), (float('inf'), 4)])
+def test_save_max_files(max_files, n_expct, tmpdir):
+    model = torch.nn.Linear(10, 2)
+    model_ls = io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', max_files=max_files)
+
+    for _ in range(4):
+        model_ls.save(model)
+
+    assert len(tmpdir.listdir('*.pt')) == n_expct
+
+
+def test_max_files_invalid():
+    with pytest.raises(ValueError):
+        io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, max_files=0)
+
+
+def test_save_atomic(tmpdir):
+    model = torch.nn.Linear(10, 2)
+    model_ls = io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', max_files=1, save_format='raw')
+    model_ls.save(model)
+
+    # a failing write (bfloat16 is not supported by the raw format) leaves the previous file intact
+    with pytest.raises(TypeError):
+        model_ls.save(torch.nn.Linear(10, 2).to(torch.bfloat16))
+
+    assert {p.basename for p in tmpdir.listdir()} == {'model_0.bin', 'model_0.meta',
+                                                      'model_0.bin' + io_model._hash_suffix}, \
+        "Temporary file not cleaned up."
+    assert (io_model._load_raw(tmpdir / 'model_0.bin')['weight'] == model.weight).all()
+
+
+def test_save_name_time_interval(tmpdir):
+    """With a metric, the file name only changes after the time interval."""
+    model = torch.nn.Linear(10, 2)
+    model_ls = io_model.LoadSaveModel(model, output_file=tmpdir / 'model.pt', name_time_interval=3600)
+
+    for metric in (3., 2., 1.):
+        model_ls.save(model, metric)
+
+    assert tmpdir.listdir('*.pt') == [tmpdir / 'model_0.pt']
+
+
+def test_load_init_cached(tmpdir):
+    f = tmpdir / 'warmstart.pt'
+    model_ref = torch.nn.Linear(10, 2)
+    torch.save(model_ref.state_dict(), str(f))
+    io_model._load_state_dict.cache_clear()
+
+    update = {'bias': torch.zeros(2)}
+    model_a = io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, input_file=f,
+                                     state_dict_update=update).load_init('cpu')
+    model_b = io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, input_file=f).load_init('cpu')
+
+    assert io_model._load_state_dict.cache_info().hits == 1
+    assert (model_a.bias == 0.).all()
+    assert (model_b.bias == model_ref.bias).all(), "State dict update must not leak into the cache."
+    assert model_a.hash == model_b.hash
+
+    # a changed file is loaded again (mtime set explicitly since its resolution depends on the file system)
+    st = os.stat(f)
+    torch.save(torch.nn.Linear(10, 2).state_dict(), str(f))
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    model_c = io_model.LoadSaveModel(torch.nn.Linear(10, 2), output_file=None, input_file=f).load_init('cpu')
+    assert io_model._load_state_dict.cache_info().misses == 2
+    assert model_c.hash != model_b.hash
@@ -1,7 +1,23 @@
 import pytest
+import torch
+
+from decode.neuralfitter.utils import log_train_val_progress
+
 
 class TestLogTrain:
 
     @pytest.fixture()
     def hallo(self):
-        return
\ No newline at end of file
+        return
+
+
+def test_frame_to_image():
+    frame = torch.zeros(32, 40)
+    frame[5, 10] = 2.
+
+    img = log_train_val_progress.frame_to_image(frame, pos=torch.Tensor([[20., 3., 0.], [100., 3., 0.]]))
+
+    assert img.size() == torch.Size([3, 40, 32])  # transposed, RGB
+    assert img.min() >= 0. and img.max() <= 1.
+    assert (img[:, 10, 5] == 1.).all()  # maximum in white
+    assert (img[:, 3, 20] == torch.Tensor([1., 0., 0.])).all()  # emitter in red, out of frame one is ignored
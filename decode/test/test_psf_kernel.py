@@ -11,6 +11,7 @@ import decode.utils.calibration_io as load_cal
 import decode.plot.frame_coord as plf
 import decode.generic.test_utils as tutil
 import decode.simulation.psf_kernel as psf_kernel
+from decode.neuralfitter.train_val_impl import _inference_mode as inference_mode  # no autograd bookkeeping needed
 from . import asset_handler
 
 
@@ -249,16 +250,19 @@ class TestCubicSplinePSF(AbstractPSFTest):
     cdir = pathlib.Path(__file__).resolve().parent
     bead_cal_file = (cdir / pathlib.Path('assets/bead_cal_for_testing_3dcal.mat'))  # expected path, might not exist
 
+    @pytest.fixture(scope='class')
+    def smap_psf(self):
+        """Have a look whether the bead calibration is there. Loaded once per class, the tests do not modify it."""
+        asset_handler.AssetHandler().auto_load(self.bead_cal_file)
+
+        return load_cal.SMAPSplineCoefficient(calib_file=str(self.bead_cal_file))
+
     @pytest.fixture()
-    def psf(self):
+    def psf(self, smap_psf):
         xextent = (-0.5, 63.5)
         yextent = (-0.5, 63.5)
         img_shape = (64, 64)
 
-        """Have a look whether the bead calibration is there"""
-        asset_handler.AssetHandler().auto_load(self.bead_cal_file)
-
-        smap_psf = load_cal.SMAPSplineCoefficient(calib_file=str(self.bead_cal_file))
         psf_impl = psf_kernel.CubicSplinePSF(xextent=xextent, yextent=yextent, img_shape=img_shape, ref0=smap_psf.ref0,
                                              coeff=smap_psf.coeff, vx_size=(1., 1., 10), roi_size=(32, 32),
                                              device='cpu')
@@ -277,10 +281,11 @@ class TestCubicSplinePSF(AbstractPSFTest):
         """
         return psf.cuda()
 
-    @pytest.fixture()
-    def onek_rois(self, psf):
+    @pytest.fixture(scope='class')
+    def onek_rois(self, smap_psf):
         """
-        Thousand random emitters in ROI
+        Thousand random emitters in ROI. Seeded and generated once per class; the spline implementation takes host
+        tensors for both the CPU and the CUDA version, hence the same tensors serve both.
 
         Returns:
             xyz:
@@ -290,8 +295,8 @@ class TestCubicSplinePSF(AbstractPSFTest):
 
         """
         n = 1000
-        xyz = torch.rand((n, 3))
-        xyz[:, :2] += psf.ref0[:2]
+        xyz = torch.rand((n, 3), generator=torch.Generator().manual_seed(0))
+        xyz[:, :2] += torch.tensor(smap_psf.ref0[:2], dtype=xyz.dtype)
         xyz[:, 2] = xyz[:, 2] * 1000 - 500
         phot = torch.ones((n,)) * 10000
         bg = 50 * torch.ones((n,))
@@ -361,6 +366,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
         self.test_pickleability_cpu(psf_cuda)
 
     @psf_cuda_available
+    @inference_mode()
     def test_roi_cuda_cpu(self, psf, psf_cuda, onek_rois):
         """
         Tests approximate equality of CUDA vs CPU implementation for a few ROIs
@@ -421,6 +427,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
         plt.show()
 
     @psf_cuda_available
+    @inference_mode()
     def test_roi_drv_cuda_cpu(self, psf, psf_cuda, onek_rois):
         """
         Tests approximate equality of CUDA and CPU implementation for a few ROIs on the derivatives.
@@ -505,6 +512,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
         assert tutil.tens_almeq(roi_0[:, 5:10, 5:10], roi_shift[:, 4:9, 3:8])
 
     @psf_cuda_available
+    @inference_mode()
     def test_frame_cuda_cpu(self, psf, psf_cuda):
         """
         Tests approximate equality of CUDA vs CPU implementation for a few frames
@@ -625,6 +633,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
         assert drv.size() == torch.Size([n, 5, *psf_cuda.roi_size_px])
         assert rois.size() == torch.Size([n, *psf_cuda.roi_size_px])
 
+    @inference_mode()
     def test_derivatives(self, psf, onek_rois):
         """
         Tests the derivate calculation
@@ -648,6 +657,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
 
         assert rois.size() == torch.Size([n, *psf.roi_size_px]), "Wrong dimension of ROIs."
 
+    @inference_mode()
     def test_fisher(self, psf, onek_rois):
         """
         Tests the fisher matrix calculation.
@@ -672,6 +682,7 @@ class TestCubicSplinePSF(AbstractPSFTest):
 
     @pytest.mark.xfail(float(torch.__version__[:3]) < 1.4,
                        reason="Pseudo inverse is not implemented in batch mode for older pytorch versions.")
+    @inference_mode()
     def test_crlb(self, psf, onek_rois):
         """
         Tests the crlb calculation
@@ -85,3 +85,33 @@ class TestVal(TestTrain):
         train_val_impl.test(model, loss, dataloader, 0, device)
 
         assert test_utils.same_weights(model_before, model)
+
+
+@pytest.mark.parametrize("device", ['cpu',
+                                    pytest.param('cuda', marks=pytest.mark.skipif(not torch.cuda.is_available(),
+                                                                                  reason="CUDA not available."))])
+def test_prefetch_device(device):
+    batches = [[torch.rand(2, 3), torch.rand(2, 4)] for _ in range(5)]
+
+    out = list(train_val_impl.prefetch_device(batches, device))
+
+    assert len(out) == len(batches)
+    for b_out, b_in in zip(out, batches):
+        assert b_out[0].device.type == device
+        assert (b_out[0].cpu() == b_in[0]).all()
+        assert (b_out[1].cpu() == b_in[1]).all()
+
+
+@pytest.mark.parametrize("device", ['cpu',
+                                    pytest.param('cuda', marks=pytest.mark.skipif(not torch.cuda.is_available(),
+                                                                                  reason="CUDA not available."))])
+def test_host_gather(device):
+    batches = [torch.rand(3, 2, 4) for _ in range(4)] + [torch.rand(1, 2, 4)]  # last batch smaller
+
+    gather = train_val_impl._HostGather(20)
+    for b in batches:
+        gather.append(b.to(device))
+    out = gather.result()
+
+    assert out.device == torch.device('cpu')
+    assert (out == torch.cat(batches, 0)).all()
@@ -42,6 +42,41 @@ def test_save_load_h5py(em_rand, em_all_attrs, save_fn, load_fn, extension, tmpd
         assert decode_meta['version'][0] == 'v'
 
 
+@pytest.mark.parametrize("pyarrow", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not emitter_io._pyarrow_available, reason="pyarrow not installed."))
+])
+def test_load_csv_parser(pyarrow, em_all_attrs, tmpdir):
+    path = str(tmpdir / 'emitter.csv')
+    emitter_io.save_csv(path, em_all_attrs.data, em_all_attrs.meta)
+
+    with mock.patch.object(emitter_io, '_pyarrow_available', pyarrow):
+        data, meta, _ = emitter_io.load_csv(path)
+
+    assert data['xyz'].is_contiguous()
+    assert data['frame_ix'].dtype == torch.long
+    assert em_all_attrs == emitter.EmitterSet(**data, **meta)
+
+
+@pytest.mark.parametrize("pyarrow", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(not emitter_io._pyarrow_available, reason="pyarrow not installed."))
+])
+def test_load_csv_float_frame_ix(pyarrow, tmpdir):
+    """Integer columns written as floats (e.g. frame 1.0) must be readable by both parsers."""
+    path = tmpdir / 'emitter.csv'
+    path.write_text('x,y,z,phot,frame_ix,id\n1.5,2.5,3.5,100.,1.0,0.0\n2.5,3.5,4.5,200.,4.0,1.0\n', 'utf-8')
+
+    mapping = dict(emitter_io.minimal_mapping, id='id')
+    with mock.patch.object(emitter_io, '_pyarrow_available', pyarrow):
+        data, _, _ = emitter_io.load_csv(path, mapping=mapping, skiprows=0, line_em_meta=None,
+                                         line_decode_meta=None)
+
+    assert data['frame_ix'].dtype == torch.long
+    assert (data['frame_ix'] == torch.tensor([1, 4])).all()
+    assert (data['id'] == torch.tensor([0, 1])).all()
+
+
 @pytest.mark.parametrize('last_index', ['including', 'excluding'])
 def test_streamer(last_index, tmpdir):
 
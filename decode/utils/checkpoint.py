@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Union, Optional
 
@@ -24,6 +26,9 @@ class CheckPoint:
         self.step = None
         self.log = None
 
+        self._writer = None  # background thread of non-blocking saves
+        self._writer_error = None
+
     @property
     def dict(self):
         return {
@@ -41,8 +46,40 @@ class CheckPoint:
         self.step = step
         self.log = log
 
-    def save(self):
-        torch.save(self.dict, self.path)
+    def save(self, blocking: bool = True):
+        """
+        Saves the checkpoint to file.
+
+        Args:
+            blocking: if False, the state is copied to the host and written to disk by a background thread, i.e. the
+             caller can continue (e.g. training) while the file is written. Errors of the background write are
+             re-raised by the next call to `save` or `wait`.
+
+        """
+        self.wait()
+
+        if blocking:
+            torch.save(self.dict, self.path)
+            return
+
+        self._writer = threading.Thread(target=self._write, args=(_copy_to_host(self.dict), self.path))
+        self._writer.start()
+
+    def _write(self, ckpt_dict: dict, path: Union[str, Path]):
+        try:
+            torch.save(ckpt_dict, path)
+        except Exception as err:  # re-raised in the main thread by wait()
+            self._writer_error = err
+
+    def wait(self):
+        """Waits until a pending non-blocking save has finished and re-raises its error, if any."""
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+        if self._writer_error is not None:
+            err, self._writer_error = self._writer_error, None
+            raise err
 
     @classmethod
     def load(cls, path: Union[str, Path], path_out: Optional[Union[str, Path]] = None):
@@ -57,7 +94,32 @@ class CheckPoint:
 
         return ckpt
 
-    def dump(self, model_state: dict, optimizer_state: dict, lr_sched_state: dict, step: int, log=None):
+    def dump(self, model_state: dict, optimizer_state: dict, lr_sched_state: dict, step: int, log=None,
+             blocking: bool = True):
         """Updates and saves to file."""
         self.update(model_state, optimizer_state, lr_sched_state, step, log)
-        self.save()
+        self.save(blocking=blocking)
+
+
+def _copy_to_host(x):
+    """
+    Recursively copies all tensors to the host, such that the result does not share memory with the (live) model or
+    optimizer anymore. Containers are copied as well, other objects are taken as they are.
+    """
+    if isinstance(x, torch.Tensor):
+        return x.detach().to('cpu', copy=True)
+
+    elif isinstance(x, dict):
+        out = OrderedDict if isinstance(x, OrderedDict) else dict
+        out = out((k, _copy_to_host(v)) for k, v in x.items())
+        if hasattr(x, '_metadata'):  # state dicts carry version information
+            out._metadata = x._metadata
+        return out
+
+    elif isinstance(x, list):
+        return [_copy_to_host(x_el) for x_el in x]
+
+    elif isinstance(x, tuple):
+        return tuple(_copy_to_host(x_el) for x_el in x)
+
+    return x
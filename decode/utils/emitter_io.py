@@ -9,6 +9,13 @@ import pandas as pd
 import torch
 from typing import Union, Tuple, Optional
 
+try:  # optional, multithreaded csv parser
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    _pyarrow_available = True
+except ImportError:
+    _pyarrow_available = False
+
 from decode.generic.emitter import EmitterSet
 from decode.utils import bookkeeping
 
@@ -125,44 +132,34 @@ def load_torch(path) -> Tuple[dict, dict, dict]:
 
 
 def save_csv(path: (str, pathlib.Path), data: dict, metadata: dict) -> None:
-    def convert_dict_torch_list(data: dict) -> dict:
-        for k, v in data.items():
-            if isinstance(v, torch.Tensor):
-                data[k] = v.tolist()
-        return data
-
-    def convert_dict_torch_numpy(data: dict) -> dict:
-        """Convert all torch tensors in dict to numpy."""
-        for k, v in data.items():
-            if isinstance(v, torch.Tensor):
-                data[k] = v.numpy()
-        return data
-
-    def change_to_one_dim(data: dict) -> dict:
+    def to_numpy(v):
+        """Numpy view of (cpu) tensors, no copy."""
+        return v.detach().cpu().numpy() if isinstance(v, torch.Tensor) else v
+
+    def to_one_dim(data: dict) -> dict:
         """
-        Change xyz tensors to be one-dimensional.
+        Flatten the emitter data to one-dimensional columns, i.e. split xyz tensors into x, y, z. Columns are views
+        of the input and the input is not modified.
 
         Args:
             data: emitterset as dictionary
 
         """
-        xyz = data.pop('xyz')
-        xyz_cr = data.pop('xyz_cr')
-        xyz_sig = data.pop('xyz_sig')
+        xyz, xyz_cr, xyz_sig = to_numpy(data['xyz']), to_numpy(data['xyz_cr']), to_numpy(data['xyz_sig'])
 
         data_one_dim = {'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2]}
-        data_one_dim.update(data)
+        data_one_dim.update({k: to_numpy(v) for k, v in data.items() if k not in ('xyz', 'xyz_cr', 'xyz_sig')})
         data_one_dim.update({'x_cr': xyz_cr[:, 0], 'y_cr': xyz_cr[:, 1], 'z_cr': xyz_cr[:, 2]})
         data_one_dim.update({'x_sig': xyz_sig[:, 0], 'y_sig': xyz_sig[:, 1], 'z_sig': xyz_sig[:, 2]})
 
         return data_one_dim
 
     """Change torch to numpy and convert 2D elements to 1D"""
-    data = copy.deepcopy(data)
-    data = change_to_one_dim(convert_dict_torch_numpy(data))
+    data = to_one_dim(data)
+    metadata = {k: v.tolist() if isinstance(v, torch.Tensor) else v for k, v in metadata.items()}
 
     decode_meta_json = json.dumps(get_decode_meta())
-    emitter_meta_json = json.dumps(convert_dict_torch_list(metadata))
+    emitter_meta_json = json.dumps(metadata)
 
     assert "\n" not in decode_meta_json, "Failed to dump decode meta string."
     assert "\n" not in emitter_meta_json, "Failed to dump emitter meta string."
@@ -171,8 +168,8 @@ def save_csv(path: (str, pathlib.Path), data: dict, metadata: dict) -> None:
     with pathlib.Path(path).open('w+') as f:
         f.write(f"# DECODE EmitterSet\n# {decode_meta_json}\n# {emitter_meta_json}\n")
 
-    df = pd.DataFrame.from_dict(data)
-    df.to_csv(path, mode='a', index=False)
+    df = pd.DataFrame(data, copy=False)
+    df.to_csv(path, mode='a', index=False, chunksize=200000)
 
 
 def load_csv(path: (str, pathlib.Path), mapping: (None, dict) = default_mapping, skiprows: int = 3,
@@ -187,7 +184,8 @@ def load_csv(path: (str, pathlib.Path), mapping: (None, dict) = default_mapping,
         skiprows: number of skipped rows before header
         line_em_meta: line ix where metadata of emitters is present (set None for no meta data)
         line_decode_meta: line ix where decode metadata is present(set None for no decode meta)
-        pd_csv_args: additional keyword arguments to be parsed to the pandas csv reader
+        pd_csv_args: additional keyword arguments to be parsed to the pandas csv reader. If none are specified and
+         pyarrow is installed, the (faster) pyarrow csv reader is used instead.
 
     Returns:
         (dict, dict, dict): Tuple of dicts containing
@@ -198,34 +196,40 @@ def load_csv(path: (str, pathlib.Path), mapping: (None, dict) = default_mapping,
 
     """
 
-    chunks = pd.read_csv(path, chunksize=100000, skiprows=skiprows, **pd_csv_args)
-    data = pd.concat(chunks)
+    if _pyarrow_available and len(pd_csv_args) == 0:
+        # integer columns are parsed as float64 (exact up to 2^53), because some files write them as floats (e.g. 1.0)
+        data = _read_csv_pyarrow(path, skiprows=skiprows, column_types={
+            v: pa.float64() if k in ('frame_ix', 'id') else pa.float32() for k, v in mapping.items()})
+
+    else:
+        if 'usecols' not in pd_csv_args:  # parse only what is needed
+            pd_csv_args['usecols'] = list(mapping.values())
+
+        data = pd.read_csv(path, skiprows=skiprows, **pd_csv_args)
+
+    def to_tensor(cols: Union[str, list], dtype) -> torch.Tensor:
+        """Converts (multiple) columns at once to a contiguous array of the target dtype and wraps it without copy"""
+        return torch.from_numpy(np.require(data[cols].to_numpy(dtype=dtype), requirements=('C', 'W')))
 
     data_dict = {
-        'xyz': torch.stack((torch.from_numpy(data[mapping['x']].to_numpy()).float(),
-                            torch.from_numpy(data[mapping['y']].to_numpy()).float(),
-                            torch.from_numpy(data[mapping['z']].to_numpy()).float()), 1),
-        'phot': torch.from_numpy(data[mapping['phot']].to_numpy()).float(),
-        'frame_ix': torch.from_numpy(data[mapping['frame_ix']].to_numpy()).long(),
+        'xyz': to_tensor([mapping['x'], mapping['y'], mapping['z']], np.float32),
+        'phot': to_tensor(mapping['phot'], np.float32),
+        'frame_ix': to_tensor(mapping['frame_ix'], np.int64),
         'id': None
     }
 
     if 'id' in mapping.keys():
-        data_dict['id'] = torch.from_numpy(data[mapping['id']].to_numpy()).long()
+        data_dict['id'] = to_tensor(mapping['id'], np.int64)
 
     if 'x_cr' in mapping.keys():
-        data_dict['xyz_cr'] = torch.stack((torch.from_numpy(data[mapping['x_cr']].to_numpy()).float(),
-                                           torch.from_numpy(data[mapping['y_cr']].to_numpy()).float(),
-                                           torch.from_numpy(data[mapping['z_cr']].to_numpy()).float()), 1)
+        data_dict['xyz_cr'] = to_tensor([mapping['x_cr'], mapping['y_cr'], mapping['z_cr']], np.float32)
 
     if 'x_sig' in mapping.keys():
-        data_dict['xyz_sig'] = torch.stack((torch.from_numpy(data[mapping['x_sig']].to_numpy()).float(),
-                                            torch.from_numpy(data[mapping['y_sig']].to_numpy()).float(),
-                                            torch.from_numpy(data[mapping['z_sig']].to_numpy()).float()), 1)
+        data_dict['xyz_sig'] = to_tensor([mapping['x_sig'], mapping['y_sig'], mapping['z_sig']], np.float32)
 
     for k in ('phot_sig', 'bg_sig', 'phot_cr', 'bg_cr'):
         if k in mapping.keys():
-            data_dict[k] = torch.from_numpy(data[mapping[k]].to_numpy()).float()
+            data_dict[k] = to_tensor(mapping[k], np.float32)
 
     """Load metadata. For some reason linecache ix is off by one (as compared to my index)."""
     if line_decode_meta is not None:
@@ -241,6 +245,24 @@ def load_csv(path: (str, pathlib.Path), mapping: (None, dict) = default_mapping,
     return data_dict, em_meta, decode_meta
 
 
+def _read_csv_pyarrow(path: (str, pathlib.Path), skiprows: int, column_types: dict) -> pd.DataFrame:
+    """
+    Reads the specified columns of a csv file with the multithreaded pyarrow parser.
+
+    Args:
+        path: path to file
+        skiprows: number of skipped rows before header
+        column_types: column names and their pyarrow types
+
+    """
+    table = pacsv.read_csv(
+        str(path),
+        read_options=pacsv.ReadOptions(skip_rows=skiprows),
+        convert_options=pacsv.ConvertOptions(column_types=column_types, include_columns=list(column_types.keys())))
+
+    return table.to_pandas()
+
+
 def load_smap(path: (str, pathlib.Path), mapping: (dict, None) = None) -> Tuple[dict, dict, dict]:
     """
 
@@ -261,21 +283,21 @@ def load_smap(path: (str, pathlib.Path), mapping: (dict, None) = None) -> Tuple[
         mapping = {'x': 'xnm', 'y': 'ynm', 'z': 'znm',
                    'phot': 'phot', 'frame_ix': 'frame', 'bg': 'bg'}
 
-    f = h5py.File(path, 'r')
-
-    loc_dict = f['saveloc']['loc']
+    with h5py.File(path, 'r') as f:
+        loc_dict = f['saveloc']['loc']
 
-    emitter_dict = {
-        'xyz': torch.cat([
-            torch.from_numpy(np.array(loc_dict[mapping['x']])).permute(1, 0),  # will always be 2D
-            torch.from_numpy(np.array(loc_dict[mapping['y']])).permute(1, 0),
-            torch.from_numpy(np.array(loc_dict[mapping['z']])).permute(1, 0)
-        ], 1),
+        """Read x, y, z straight into the columns of one preallocated array (no intermediate copies)"""
+        x = loc_dict[mapping['x']]  # will always be 2D (1 x N)
+        xyz = np.empty((x.size, 3), dtype=x.dtype)
+        for i, k in enumerate(('x', 'y', 'z')):
+            loc_dict[mapping[k]].read_direct(xyz, dest_sel=np.s_[:, i])
 
-        'phot': torch.from_numpy(np.array(loc_dict[mapping['phot']])).squeeze(),
-        'frame_ix': torch.from_numpy(np.array(loc_dict[mapping['frame_ix']])).squeeze().long(),
-        'bg': torch.from_numpy(np.array(loc_dict[mapping['bg']])).squeeze().float()
-    }
+        emitter_dict = {
+            'xyz': torch.from_numpy(xyz),
+            'phot': torch.from_numpy(loc_dict[mapping['phot']][()]).squeeze(),
+            'frame_ix': torch.from_numpy(loc_dict[mapping['frame_ix']][()]).squeeze().long(),
+            'bg': torch.from_numpy(loc_dict[mapping['bg']][()]).squeeze().float()
+        }
 
     emitter_dict['frame_ix'] -= 1  # MATLAB starts at 1, python and all serious languages at 0
 
@@ -1,64 +1,506 @@
+import contextlib
+import functools
 import hashlib
+import inspect
+import json
 import math
+import mmap
+import os
 import pathlib
+import queue
+import threading
 import time
-from typing import Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
 
+import numpy as np
 import torch
 
+try:  # optional, non-cryptographic but much faster hash to fingerprint the model file
+    import xxhash
+    _xxhash_available = True
+except ImportError:
+    _xxhash_available = False
 
-def hash_model(modelfile):
+try:  # optional, pickle-free and faster serialisation of the state dict
+    import safetensors.torch
+    _safetensors_available = True
+except ImportError:
+    _safetensors_available = False
+
+_hash_name = 'xxh3-128' if _xxhash_available else 'SHA-1'
+_hash_suffix = '.xxh3' if _xxhash_available else '.sha1'  # suffix of the sidecar file that caches the hash
+
+
+def _new_hasher():
+    return xxhash.xxh3_128() if _xxhash_available else hashlib.sha1()
+
+
+def _hash_buffer(buf) -> str:
+    hasher = _new_hasher()
+    hasher.update(buf)  # releases the GIL for large buffers
+    return hasher.hexdigest()
+
+
+def _madvise(mm: mmap.mmap, advice: str):
+    """Gives the kernel a hint on how a mapping is going to be accessed (where supported, i.e. Linux & Python 3.8+)."""
+    if hasattr(mm, 'madvise') and hasattr(mmap, advice):
+        mm.madvise(getattr(mmap, advice))
+
+
+# zip based format, explicitly since it is not the default for all torch versions (the legacy format is much slower)
+_torch_save_kwargs = {'_use_new_zipfile_serialization': True} \
+    if '_use_new_zipfile_serialization' in inspect.signature(torch.save).parameters else {}
+
+
+_torch_save_config_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _torch_save_config(crc32: bool):
+    """
+    Stages CUDA tensors in pinned memory for the device to host copy of torch.save and optionally skips the CRC32 of
+    the zip records. Only options known to the installed torch version are set, no-op for versions without the
+    serialisation config (< 2.6).
+
+    Warning:
+        The serialisation config is global to the process, i.e. torch.save calls in other threads that run meanwhile
+        (e.g. a non-blocking CheckPoint save) see the patched options as well. Saves through this context are
+        serialised among each other, such that they at least do not undo each other's options.
+
+    """
+    try:
+        from torch.utils.serialization import config
+        save_config = config.save
+    except (ImportError, AttributeError):
+        yield
+        return
+
+    options = {'compute_crc32': crc32, 'use_pinned_memory_for_d2h': True}
+    options = {f'save.{k}': v for k, v in options.items() if hasattr(save_config, k)}
+    if not options:
+        yield
+        return
+
+    with _torch_save_config_lock, config.patch(options):
+        yield
+
+
+class _DirectWriter:
+    """
+    Write-only binary file that bypasses the page cache (O_DIRECT, Linux). Data is collected in a page aligned buffer
+    and written in whole blocks, the padding of the last block is truncated on close. Only pays off for large files,
+    which would otherwise evict other data from the page cache and stall on writeback.
+    """
+    _block_size = 4096
+    _buffer_size = 2 ** 23  # multiple of the block size
+
+    def __init__(self, fname):
+        self._fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+        self._buf = mmap.mmap(-1, self._buffer_size)  # anonymous mappings are page aligned as required by O_DIRECT
+        self._view = memoryview(self._buf)
+        self._n_buf = 0  # bytes currently in the buffer
+        self._n_total = 0  # bytes written by the caller
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(data):
+            n = min(self._buffer_size - self._n_buf, len(data) - pos)
+            self._view[self._n_buf:self._n_buf + n] = data[pos:pos + n]
+            self._n_buf += n
+            pos += n
+
+            if self._n_buf == self._buffer_size:
+                self._flush_buffer()
+
+        self._n_total += len(data)
+        return len(data)
+
+    def flush(self):  # only whole blocks can be written, the rest is written on close
+        return
+
+    def _flush_buffer(self):
+        n = self._n_buf + (-self._n_buf % self._block_size)  # pad to whole blocks
+        pos = 0
+        while pos < n:
+            pos += os.write(self._fd, self._view[pos:n])
+        self._n_buf = 0
+
+    def close(self):
+        if self._fd is None:
+            return
+
+        try:
+            if self._n_buf > 0:
+                self._flush_buffer()
+            os.ftruncate(self._fd, self._n_total)  # remove the padding
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._view.release()
+            self._buf.close()
+
+
+class _HashingWriter:
+    """Wraps a binary file object and hashes everything that is written through it (as `hash_model` would)."""
+
+    def __init__(self, f):
+        self._f = f
+        self._hasher = _new_hasher()
+
+    def write(self, data) -> int:
+        self._hasher.update(data)
+        return self._f.write(data)
+
+    def flush(self):
+        return self._f.flush()
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+
+@contextlib.contextmanager
+def _open_write_atomic(fname: str, direct: bool = False):
+    """Writes to a temporary file first and then replaces the target, i.e. readers never see a partial file."""
+    fname_tmp = fname + '.tmp'
+    try:
+        with _open_write(fname_tmp, direct=direct) as f:
+            yield f
+
+        os.replace(fname_tmp, fname)
+
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(fname_tmp)
+        raise
+
+
+def _open_write(fname, direct: bool = False):
+    """Opens a file for binary writing, bypassing the page cache if requested and supported by OS / file system."""
+    if direct and hasattr(os, 'O_DIRECT'):
+        try:
+            return _DirectWriter(fname)
+        except OSError:  # e.g. file systems without O_DIRECT support (tmpfs)
+            pass
+
+    return open(fname, 'wb')
+
+
+class _HostStaging:
     """
-    Calculate hash and show it to the user.
+    Copies state dicts to host memory, such that they do not share memory with the (live) model anymore. Tensors are
+    staged in one (pinned) buffer per dtype, i.e. all device to host copies are issued asynchronously and there is only
+    a single synchronisation instead of one per tensor. The layout is computed once and released buffers are reused,
+    since the structure of a model's state dict does not change between saves.
+    """
+
+    def __init__(self, state_dict: dict):
+        self.on_cuda = any(v.is_cuda for v in state_dict.values())
+
+        self._plan = []  # name, dtype, size and offset (in its dtype's buffer) per tensor
+        self._numel = OrderedDict()  # buffer size per dtype
+        for k, v in state_dict.items():
+            offset = self._numel.get(v.dtype, 0)
+            self._plan.append((k, v.dtype, v.size(), offset))
+            self._numel[v.dtype] = offset + v.numel()
+
+        self._free = []  # released buffers
+
+    def matches(self, state_dict: dict) -> bool:
+        return len(state_dict) == len(self._plan) and \
+               any(v.is_cuda for v in state_dict.values()) == self.on_cuda and \
+               all(k == k_plan and v.dtype == dtype and v.size() == size
+                   for (k_plan, dtype, size, _), (k, v) in zip(self._plan, state_dict.items()))
+
+    def acquire(self) -> dict:
+        if self._free:
+            return self._free.pop()
+        return {dtype: torch.empty(n, dtype=dtype, pin_memory=self.on_cuda) for dtype, n in self._numel.items()}
+
+    def release(self, buffers: dict):
+        """Buffers must only be released when the state dict copied into them is not used anymore."""
+        self._free.append(buffers)
+
+    def copy(self, state_dict: dict, buffers: dict) -> OrderedDict:
+        state_dict_host = OrderedDict()
+        for (k, dtype, size, offset), v in zip(self._plan, state_dict.values()):
+            state_dict_host[k] = buffers[dtype][offset:offset + v.numel()].view(size)
+            state_dict_host[k].copy_(v.detach(), non_blocking=self.on_cuda)
+
+        if self.on_cuda:
+            torch.cuda.synchronize()
+
+        if hasattr(state_dict, '_metadata'):  # version information of the modules
+            state_dict_host._metadata = state_dict._metadata
+
+        return state_dict_host
+
+
+_raw_alignment = 4096  # tensors in .bin files start at multiples of this, e.g. to allow for O_DIRECT reads
+
+
+def _dump_raw(state_dict: dict, f) -> dict:
+    """
+    Writes the raw bytes of the tensors of a state dict (without pickling) to a .bin file, every tensor aligned to
+    `_raw_alignment`. Supports all dtypes that have a numpy equivalent.
+
+    Args:
+        state_dict: state dict
+        f: binary file object
+
+    Returns:
+        meta information (dtype, shape, byte offset and size per tensor) to be stored in the accompanying .meta file
+
+    """
+    meta = {'tensors': OrderedDict(), 'metadata': getattr(state_dict, '_metadata', None)}
+    offset = 0
+    for k, v in state_dict.items():
+        a = v.detach().cpu().contiguous().numpy()  # not np.ascontiguousarray, which turns 0-d tensors into 1-d ones
+
+        pad = -offset % _raw_alignment
+        if pad:
+            f.write(bytes(pad))
+            offset += pad
+
+        f.write(a.reshape(-1).view(np.uint8))
+        meta['tensors'][k] = {'dtype': a.dtype.str, 'shape': tuple(v.shape), 'offset': offset, 'nbytes': a.nbytes}
+        offset += a.nbytes
+
+    return meta
+
+
+def _load_raw(path) -> OrderedDict:
+    """
+    Loads a state dict written as .bin / .meta pair (see `_dump_raw`), path may point to either of them. The tensors are
+    zero-copy views of a private (copy-on-write) mapping of the .bin file, i.e. nothing is read before it is accessed and
+    modifying the tensors does not alter the file.
+    """
+    path = pathlib.Path(path)
+    meta = json.loads(path.with_suffix('.meta').read_text())
+
+    with open(path.with_suffix('.bin'), 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:  # the mapping stays alive as long as the tensors do
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:  # empty files can not be mapped
+            buf = bytearray()
+
+    state_dict = OrderedDict()
+    for k, t in meta['tensors'].items():
+        dtype = np.dtype(t['dtype'])
+        a = np.frombuffer(buf, dtype=dtype, count=t['nbytes'] // dtype.itemsize, offset=t['offset'])
+        state_dict[k] = torch.from_numpy(a.reshape(t['shape']))
+
+    if meta['metadata'] is not None:  # version information of the modules
+        state_dict._metadata = meta['metadata']
+
+    return state_dict
+
+
+def _hash_cache_path(modelfile) -> pathlib.Path:
+    p = pathlib.Path(modelfile)
+    return p.with_name(p.name + _hash_suffix)
+
+
+def _hash_cache_key(modelfile) -> str:
+    """The file is considered unchanged as long as its size and modification time are."""
+    st = os.stat(modelfile)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _read_hash_cache(modelfile, key: str) -> Optional[str]:
+    try:
+        cached_key, digest = _hash_cache_path(modelfile).read_text().split('\n')[:2]
+    except (OSError, ValueError):
+        return None
+
+    return digest if cached_key == key else None
+
+
+def _write_hash_cache(modelfile, key: str, digest: str):
+    p = _hash_cache_path(modelfile)
+    p_tmp = p.with_name(p.name + f'.{os.getpid()}.tmp')
+    try:
+        p_tmp.write_text(f"{key}\n{digest}\n")
+        os.replace(p_tmp, p)  # atomic, i.e. concurrent readers never see a partial file
+    except OSError:  # e.g. read-only file system, the hash is then simply recomputed next time
+        pass
+
+
+def hash_model(modelfile, cache: bool = True):
+    """
+    Calculate hash and show it to the user. Uses xxh3-128 if xxhash is installed, SHA-1 otherwise. The hash only
+    identifies the model file, it is not meant for anything security related.
     (https://www.pythoncentral.io/hashing-files-with-python/)
+
+    Args:
+        modelfile: path to the model file
+        cache: look up / store the hash in a sidecar file next to the model file, keyed by the size and modification
+         time of the model file. Rehashing an unchanged file then only costs a stat.
+
     """
-    blocksize = 65536
-    hasher = hashlib.sha1()
-    with open(modelfile, 'rb') as afile:
-        buf = afile.read(blocksize)
-        while len(buf) > 0:
-            hasher.update(buf)
-            buf = afile.read(blocksize)
-    return hasher.hexdigest()
+    key = _hash_cache_key(modelfile)
+    if cache:
+        digest = _read_hash_cache(modelfile, key)
+        if digest is not None:
+            return digest
+
+    buf = bytearray(2 ** 20)  # one buffer for all reads, large blocks mean few reads
+    buf_view = memoryview(buf)
+    hasher = _new_hasher()
+    with open(modelfile, 'rb', buffering=0) as afile:  # unbuffered since we read in large blocks anyway
+        n = afile.readinto(buf)
+        while n:
+            hasher.update(buf_view[:n])
+            n = afile.readinto(buf)
+    digest = hasher.hexdigest()
+
+    if cache:
+        _write_hash_cache(modelfile, key, digest)
+
+    return digest
+
+
+@functools.lru_cache(maxsize=4)
+def _load_state_dict(path: str, key: str) -> Tuple[OrderedDict, str]:
+    """
+    Loads a model file to host memory and hashes it. Results are cached per process by path and `_hash_cache_key`,
+    i.e. loading an unchanged file again (e.g. the same warmstart model for multiple models) does not touch the file.
+    Note that the returned tensors are shared by all callers and must not be modified in place.
+
+    Args:
+        path: absolute path of the model file
+        key: cache key of the file (changes when the file changes)
+
+    Returns:
+        state_dict, hash
+
+    """
+    hashv = _read_hash_cache(path, key)
+
+    # the file is mapped once and the same pages serve both, hashing and deserialisation
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            ThreadPoolExecutor(max_workers=1) as executor:
+
+        # hash in the background while deserialising, the executor is shut down before the mapping is closed
+        if hashv is None:
+            _madvise(mm, 'MADV_SEQUENTIAL')
+            hash_future = executor.submit(_hash_buffer, mm)
+
+        path_ = pathlib.Path(path)
+        if path_.suffix == '.safetensors':
+            if not _safetensors_available:
+                raise ImportError("Loading a safetensors file requires the safetensors package.")
+            state_dict = safetensors.torch.load_file(path, device='cpu')
+        elif path_.suffix == '.bin' and path_.with_suffix('.meta').is_file():  # otherwise e.g. a pickled .bin file
+            state_dict = _load_raw(path)
+        else:
+            state_dict = torch.load(mm, map_location='cpu')
+
+        if hashv is None:
+            hashv = hash_future.result()
+            _write_hash_cache(path, key, hashv)
+
+    return state_dict, hashv
 
 
 class LoadSaveModel:
+    _save_formats = {'pt': '.pt', 'safetensors': '.safetensors', 'raw': '.bin'}  # format and respective file suffix
+
     def __init__(self, model_instance, output_file: (str, pathlib.Path), input_file=None, name_time_interval=(60 * 60),
-                 better_th=1e-6, max_files=3, state_dict_update=None):
+                 better_th=1e-6, max_files=3, state_dict_update=None, save_format: str = 'pt', crc32: bool = True,
+                 async_save: bool = False, direct_io: bool = False):
+        """
+
+        Args:
+            model_instance: model
+            output_file: path of the saved model, a running index is appended to the file name
+            input_file: model file to warmstart from (.pt, .safetensors or .bin / .meta)
+            name_time_interval: time (s) after which the running index of the output file is increased
+            better_th: relative improvement of the metric that is required to save the model
+            max_files: number of output files to rotate through, None, -1 or inf for no limit
+            state_dict_update: update the loaded state dict with these values
+            save_format: 'pt' (torch.save), 'safetensors' (requires the safetensors package) or 'raw' (raw tensor
+             bytes in a .bin file and their layout in a .meta JSON file, see `_dump_raw`)
+            crc32: write CRC32 checksums into .pt files. Skipping them makes saving faster (torch >= 2.6) but older
+             torch versions and zip tools will report the files as corrupted.
+            async_save: copy the state dict to the host and write it in a background thread. A save that is still
+             pending when the next one comes in is dropped. Call `close` to make sure everything is written.
+            direct_io: write bypassing the page cache (O_DIRECT) where supported. Only worth it for very large models.
+
+        """
+        if save_format not in self._save_formats:
+            raise ValueError(f"Unsupported save format {save_format}, choose from {tuple(self._save_formats)}.")
+        if save_format == 'safetensors' and not _safetensors_available:
+            raise ImportError("Saving as safetensors requires the safetensors package.")
 
         self.warmstart_file = pathlib.Path(input_file) if input_file is not None else None
         self.output_file = pathlib.Path(output_file) if output_file is not None else None
+        if self.output_file is not None:  # fixed parts of the output file names, computed once
+            self._output_dir = self.output_file.parent
+            self._output_stem = str(self.output_file.with_suffix(''))
+        self._folder_created = False
         self.output_file_suffix = -1  # because will be increased to one in the first round
         self.model = model_instance
         self.name_time_interval = name_time_interval
 
-        self._last_saved = 0  # timestamp when it was saved last
-        self._new_name_time = 0  # timestamp when the name changed last
+        # monotonic timestamps, i.e. not affected by changes of the system clock
+        self._last_saved = -math.inf  # timestamp when it was saved last
+        self._new_name_time = -math.inf  # timestamp when the name changed last
         self._best_metric_val = math.inf
         self.better_th = better_th
-        self.max_files = max_files if ((max_files is not None) or (max_files != -1)) else float('inf')
+        no_limit = max_files is None or max_files == -1 or math.isinf(max_files)
+        self.max_files = float('inf') if no_limit else int(max_files)
+        if self.max_files < 1:
+            raise ValueError(f"max_files must be at least 1 (or None / -1 / inf for no limit), not {max_files}.")
         self.state_dict_update = state_dict_update
+        self.save_format = save_format
+        self.crc32 = crc32
+        self.direct_io = direct_io
+
+        self._staging = None  # host staging buffers, kept across saves
+        self._queue = None
+        self._writer = None  # background thread of asynchronous saves
+        self._writer_error = None
+        if async_save:
+            self._queue = queue.Queue(maxsize=1)  # single slot, i.e. newer saves replace pending ones
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
 
     def _create_target_folder(self):
         """
-        Creates the target folder for the network output .pt file, if it does not exists already
+        Creates the target folder for the network output .pt file, if it does not exists already. Only checked on the
+        first call.
 
         """
-        p = pathlib.Path(self.output_file)
+        if self._folder_created:
+            return
+
         try:
-            pathlib.Path(p.parents[0]).mkdir(parents=False, exist_ok=True)
+            self._output_dir.mkdir(parents=False, exist_ok=True)
         except FileNotFoundError:
             raise FileNotFoundError("I will only create the last folder for model saving. But the path you specified "
                                     "lacks more folders or is completely wrong.")
 
+        self._folder_created = True
+
     def load_init(self, device: Union[str, torch.device, None] = None):
         """
         Init and warmstart model (if possible) and ship to specified device
 
         Args:
-            device:
+            device: device the model is always moved to, whether it is warmstarted or not (defaults to 'cuda:0' if
+             available, 'cpu' otherwise). The warmstart state dict is deserialised to host memory first.
 
         Returns:
+            model on the device in eval mode
 
         """
         if device is None:
@@ -70,18 +512,28 @@ class LoadSaveModel:
             print('Model initialised as specified in the constructor.')
 
         else:
-            hashv = hash_model(self.warmstart_file)
-            print(f'Model SHA-1 hash: {hashv}')
-            model.hash = hashv
+            # the .bin file of the raw format identifies the model, not its .meta file
+            warmstart_file = self.warmstart_file.resolve()
+            if warmstart_file.suffix == '.meta':
+                warmstart_file = warmstart_file.with_suffix('.bin')
+
+            # deserialise to host memory, loading straight to the GPU would temporarily double the memory there
+            state_dict, hashv = _load_state_dict(str(warmstart_file), _hash_cache_key(warmstart_file))
 
-            state_dict = torch.load(self.warmstart_file, map_location=device)
-            if self.state_dict_update is not None:
+            print(f'Model {_hash_name} hash: {hashv}')
+            model.hash = hashv
+            if self.state_dict_update is not None:  # on a copy, the cached state dict must not be modified
+                metadata = getattr(state_dict, '_metadata', None)
+                state_dict = OrderedDict(state_dict)
                 state_dict.update(self.state_dict_update)
+                if metadata is not None:
+                    state_dict._metadata = metadata
 
             model.load_state_dict(state_dict)
 
             print('Loaded pretrained model: {}'.format(self.warmstart_file))
 
+        model = model.to(device)
         model.eval()
         return model
 
@@ -94,6 +546,9 @@ class LoadSaveModel:
             metric_val:
 
         """
+        now = time.monotonic()
+        self._raise_writer_error()  # before any staging buffer is taken, which would leak otherwise
+
         # create folder if does not exists
         self._create_target_folder()
 
@@ -106,16 +561,99 @@ class LoadSaveModel:
                 return
 
         """After a certain period, change the suffix."""
-        if (time.time() > self._new_name_time + self.name_time_interval) or metric_val is None:
+        if (now > self._new_name_time + self.name_time_interval) or metric_val is None:
             self.output_file_suffix += 1
             if self.output_file_suffix > self.max_files - 1:
                 self.output_file_suffix = 0
 
-            self._new_name_time = time.time()
+            self._new_name_time = now
 
         """Determine file name and save."""
-        fname = pathlib.Path(str(self.output_file.with_suffix('')) + '_' + str(self.output_file_suffix) + '.pt')
-        torch.save(model.state_dict(), fname)
-        print('Saved model to file: {}'.format(fname))
+        fname = f"{self._output_stem}_{self.output_file_suffix}{self._save_formats[self.save_format]}"
+        state_dict = model.state_dict()
+        release = None
+        # copy to the host in one batch; asynchronous saves need a snapshot anyway
+        if self._writer is not None or any(v.is_cuda for v in state_dict.values()):
+            if self._staging is None or not self._staging.matches(state_dict):
+                self._staging = _HostStaging(state_dict)
+            buffers = self._staging.acquire()
+            release = functools.partial(self._staging.release, buffers)
+            try:
+                state_dict = self._staging.copy(state_dict, buffers)
+            except BaseException:
+                release()
+                raise
+
+        if self._writer is None:
+            try:
+                self._write(state_dict, fname)
+            finally:
+                if release is not None:
+                    release()
+            print('Saved model to file: {}'.format(fname))
+        else:
+            self._enqueue((state_dict, fname, release))
+
+        self._last_saved = now
+
+    def _write(self, state_dict: dict, fname: str):
+        # hashed while writing, i.e. loading the file later does not require an extra pass over it to hash it
+        with _open_write_atomic(fname, direct=self.direct_io) as f:
+            f = _HashingWriter(f)
+            if self.save_format == 'safetensors':  # writes the storages as they are, without pickling
+                f.write(safetensors.torch.save(state_dict))
+            elif self.save_format == 'raw':
+                meta = _dump_raw(state_dict, f)
+            else:
+                with _torch_save_config(crc32=self.crc32):
+                    torch.save(state_dict, f, **_torch_save_kwargs)
+
+        _write_hash_cache(fname, _hash_cache_key(fname), f.hexdigest())
+
+        if self.save_format == 'raw':  # after the data, i.e. the meta information never refers to missing data
+            with _open_write_atomic(str(pathlib.Path(fname).with_suffix('.meta'))) as f:
+                f.write(json.dumps(meta).encode())
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:  # drop the pending save in favour of the newer one
+            try:
+                _, _, release = self._queue.get_nowait()
+                release()
+                self._queue.task_done()
+            except queue.Empty:  # the writer picked it up in the meantime
+                pass
+            self._queue.put_nowait(item)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+
+                state_dict, fname, release = item
+                try:
+                    self._write(state_dict, fname)
+                finally:
+                    release()
+                print('Saved model to file: {}'.format(fname))
+            except Exception as err:  # re-raised in the main thread on the next save or on close
+                self._writer_error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise_writer_error(self):
+        if self._writer_error is not None:
+            err, self._writer_error = self._writer_error, None
+            raise err
+
+    def close(self):
+        """Waits until pending (asynchronous) saves are written and stops the writer. Subsequent saves are blocking."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
 
-        self._last_saved = time.time()
+        self._raise_writer_error()
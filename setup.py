@@ -39,12 +39,22 @@ else:
         "tqdm",
         ]
 
+# optional, faster (model) i/o; decode falls back to the standard library / pytorch if they are missing
+extras = {
+    "io": [
+        "pyarrow",  # multithreaded csv parsing of emitters
+        "safetensors",  # LoadSaveModel(save_format='safetensors')
+        "xxhash",  # xxh3-128 model hashes instead of sha1
+    ],
+}
+
 setup(
     name='decode',
     version='0.10.1dev1',  # do not modify by hand set and sync with bumpversion
     packages=setuptools.find_packages(),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras,
     entry_points={
         'console_scripts': [
             'decode.train = decode.neuralfitter.train.train:main',